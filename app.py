@@ -1,66 +1,52 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, abort, request, jsonify, send_from_directory
 from flask_cors import CORS
-import smtplib
-import socket
-import threading
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-# twilio imported conditionally below (only if credentials provided)
-from apscheduler.schedulers.background import BackgroundScheduler
-from datetime import datetime
+from flask.json.provider import DefaultJSONProvider
+from datetime import datetime, timezone
+import hashlib
+import logging
+import mimetypes
 import os
-from dotenv import load_dotenv
+import orjson
+from apscheduler.jobstores.base import JobLookupError
 
-# LLM Integration
-from llm_service import get_llm_service, AppointmentExtraction
-from validators import validate_appointment_data, sanitize_user_input
-
-# Load environment variables
-load_dotenv()
+from config import CONFIG
 
-app = Flask(__name__)
-CORS(app)
+# Notifications (email/SMS) and reminder scheduling
+from notifications import (
+    sms_enabled, scheduler,
+    send_confirmation, send_reminder,
+)
 
-# Configuration
-EMAIL_USER = os.getenv('EMAIL_USER')           # used as sender address
-EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')   # Gmail App Password (local dev only)
-SENDGRID_API_KEY = os.getenv('SENDGRID_API_KEY')  # Use on Render (SMTP blocked on free tier)
+# LLM Integration
+from llm_service import get_llm_service, AppointmentExtraction
+from validators import validate_appointment_data, sanitize_user_input, ScheduleRequest
+from pydantic import ValidationError
 
-# Detect which email method to use
-if SENDGRID_API_KEY:
-    print("✅ Email via SendGrid API")
-elif EMAIL_USER and EMAIL_PASSWORD:
-    print("✅ Email via Gmail SMTP (local dev)")
-else:
-    print("ℹ️ Email notifications disabled")
+# Per-send notification logs go through logging; set LOG_LEVEL=DEBUG for detail
+logging.basicConfig(
+    level=CONFIG.log_level,
+    format='%(levelname)s %(name)s: %(message)s'
+)
 
-# Twilio is optional - only initialize if credentials provided
-TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
-TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
-TWILIO_PHONE_NUMBER = os.getenv('TWILIO_PHONE_NUMBER')
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson (used by jsonify and request.json)"""
 
-twilio_client = None
-sms_enabled = False
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
 
-# Only initialize Twilio if all credentials are provided
-if TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and TWILIO_PHONE_NUMBER:
-    try:
-        from twilio.rest import Client
-        twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-        sms_enabled = True
-        print("✅ SMS notifications enabled")
-    except Exception as e:
-        print(f"⚠️ Twilio not available: {e}")
-        sms_enabled = False
-else:
-    print("ℹ️ SMS notifications disabled (no Twilio credentials)")
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
-# Scheduler for reminders
-scheduler = BackgroundScheduler()
-scheduler.start()
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS),
+            mimetype=self.mimetype
+        )
 
-# In-memory storage for scheduled jobs
-scheduled_jobs = {}
+app = Flask(__name__)
+app.json = OrjsonProvider(app)
+CORS(app)
 
 # Initialize LLM service
 llm_service = get_llm_service()
@@ -70,209 +56,61 @@ if llm_enabled:
 else:
     print("ℹ️ Natural language processing disabled (missing GEMINI_API_KEY)")
 
-def send_email(to_email, subject, html_content):
-    """Send email — Resend → SendGrid → SMTP (local) in order of preference"""
-    import urllib.request, json as _json
-
-    # ── 1. Resend API (easiest, works on Render free tier) ──────────────────
-    RESEND_API_KEY = os.getenv('RESEND_API_KEY')
-    if RESEND_API_KEY:
-        try:
-            # Resend Free Tier: MUST send from onboarding@resend.dev (unless you verify a domain)
-            sender = "Appointment Bot <onboarding@resend.dev>"
-            params = {
-                "from": sender,
-                "to": [to_email],
-                "subject": subject,
-                "html": html_content
-            }
-            if EMAIL_USER:
-                params["reply_to"] = EMAIL_USER
-
-            payload = _json.dumps(params).encode()
-            req = urllib.request.Request(
-                "https://api.resend.com/emails",
-                data=payload,
-                headers={
-                    "Authorization": f"Bearer {RESEND_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                method="POST"
-            )
-            with urllib.request.urlopen(req, timeout=30) as resp:
-                if resp.status in (200, 201):
-                    print(f"[EMAIL] ✅ Resend → {to_email}")
-                    return True
-                print(f"[EMAIL] ❌ Resend status {resp.status}")
-                return False
-        except Exception as e:
-            print(f"[EMAIL] ❌ Resend error: {e}")
-            return False
+# Front-end files are read once at startup and served from memory
+FRONTEND_FILES = ('index.html', 'styles.css', 'script.js', 'nl_mode.js')
 
-    # ── 2. SendGrid API ──────────────────────────────────────────────────────
-    if SENDGRID_API_KEY:
+def _load_frontend_files():
+    """Read front-end files into memory: {name: (bytes, mimetype, etag)}"""
+    files = {}
+    for name in FRONTEND_FILES:
+        path = os.path.join(app.root_path, name)
         try:
-            payload = _json.dumps({
-                "personalizations": [{"to": [{"email": to_email}]}],
-                "from": {"email": EMAIL_USER or "noreply@appointmentbot.com", "name": "Appointment Bot"},
-                "subject": subject,
-                "content": [{"type": "text/html", "value": html_content}]
-            }).encode()
-            req = urllib.request.Request(
-                "https://api.sendgrid.com/v3/mail/send",
-                data=payload,
-                headers={
-                    "Authorization": f"Bearer {SENDGRID_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                method="POST"
-            )
-            with urllib.request.urlopen(req, timeout=30) as resp:
-                if resp.status in (200, 202):
-                    print(f"[EMAIL] ✅ SendGrid → {to_email}")
-                    return True
-                print(f"[EMAIL] ❌ SendGrid status {resp.status}")
-                return False
-        except Exception as e:
-            print(f"[EMAIL] ❌ SendGrid error: {e}")
-            return False
-
-    # ── 3. Gmail SMTP — local dev only (blocked on Render free tier) ─────────
-    if not EMAIL_USER or not EMAIL_PASSWORD:
-        print("[EMAIL] Skipped — no credentials configured")
-        return False
-    try:
-        from email.mime.multipart import MIMEMultipart
-        from email.mime.text import MIMEText
-        msg = MIMEMultipart('alternative')
-        msg['From'] = f"Appointment Bot <{EMAIL_USER}>"
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        msg.attach(MIMEText(html_content, 'html'))
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465, timeout=30) as server:
-            server.login(EMAIL_USER, EMAIL_PASSWORD)
-            server.send_message(msg)
-        print(f"[EMAIL] ✅ SMTP → {to_email}")
-        return True
-    except Exception as e:
-        print(f"[EMAIL] ❌ SMTP error: {e}")
-        return False
-
-def send_sms(to_phone, message):
-    """Send SMS using Twilio (if enabled)"""
-    if not sms_enabled or not twilio_client:
-        print("SMS not enabled - skipping")
-        return False
-        
-    try:
-        message = twilio_client.messages.create(
-            body=message,
-            from_=TWILIO_PHONE_NUMBER,
-            to=to_phone
-        )
-        print(f"SMS sent to {to_phone}: {message.sid}")
-        return True
-    except Exception as e:
-        print(f"Error sending SMS: {e}")
-        return False
-
-def format_datetime(iso_string):
-    """Format ISO datetime string for display in IST timezone"""
-    from datetime import timezone, timedelta
-    # Parse the ISO string as UTC
-    dt = datetime.fromisoformat(iso_string.replace('Z', '+00:00'))
-    # Convert to IST (UTC+5:30)
-    ist = timezone(timedelta(hours=5, minutes=30))
-    dt_ist = dt.astimezone(ist)
-    return dt_ist.strftime('%A, %B %d, %Y at %I:%M %p')
-
-def send_reminder(appointment_id, subject, email, phone, datetime_str):
-    """Send reminder via email and SMS"""
-    print(f"Sending reminder for: {subject}")
-    
-    # Send email reminder
-    if email:
-        email_html = f"""
-        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-            <h2 style="color: #ef4444;">⏰ Appointment Reminder</h2>
-            <p>This is your scheduled appointment reminder!</p>
-            <div style="background: #fef2f2; padding: 20px; border-radius: 10px; margin: 20px 0; border-left: 4px solid #ef4444;">
-                <h3 style="margin-top: 0; color: #991b1b;">Time for your appointment</h3>
-                <p><strong>Subject:</strong> {subject}</p>
-                <p><strong>Scheduled Time:</strong> {format_datetime(datetime_str)}</p>
-            </div>
-            <p style="color: #64748b; font-size: 14px;">- Your Appointment Bot</p>
-        </div>
-        """
-        send_email(email, f"⏰ Reminder: {subject}", email_html)
-    
-    # Send SMS reminder
-    if phone:
-        sms_message = f"⏰ APPOINTMENT REMINDER\n\n\"{subject}\"\n\nScheduled for: {format_datetime(datetime_str)}\n\nTime to get ready!"
-        send_sms(phone, sms_message)
-    
-    # Schedule follow-up "late" reminder for 2 minutes after
-    if email or phone:  # Send late reminder if email or phone is provided
-        from datetime import timedelta
-        reminder_time = datetime.fromisoformat(datetime_str.replace('Z', '+00:00'))
-        late_reminder_time = reminder_time + timedelta(minutes=2)
-        
-        scheduler.add_job(
-            send_late_reminder,
-            'date',
-            run_date=late_reminder_time,
-            args=[subject, email, phone, datetime_str]
-        )
-        print(f"[INFO] Late reminder scheduled for {late_reminder_time}")
-    
-    # Clean up scheduled job
-    if appointment_id in scheduled_jobs:
-        del scheduled_jobs[appointment_id]
-
-def send_late_reminder(subject, email, phone, datetime_str):
-    """Send a follow-up reminder 2 minutes after appointment time via email and SMS"""
-    print(f"Sending late reminder for: {subject}")
-    
-    if email:
-        late_email_html = f"""
-        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-            <h2 style="color: #dc2626;">⚠️ Appointment Follow-up</h2>
-            <p>This is a follow-up reminder for your appointment that was scheduled 2 minutes ago.</p>
-            <div style="background: #fee2e2; padding: 20px; border-radius: 10px; margin: 20px 0; border-left: 4px solid #dc2626;">
-                <h3 style="margin-top: 0; color: #991b1b;">Were you able to attend?</h3>
-                <p><strong>Subject:</strong> {subject}</p>
-                <p><strong>Scheduled Time:</strong> {format_datetime(datetime_str)}</p>
-                <p style="margin-top: 15px; font-size: 14px;">If you missed this appointment, please reschedule at your earliest convenience.</p>
-            </div>
-            <p style="color: #64748b; font-size: 14px;">- Your Appointment Bot</p>
-        </div>
-        """
-        send_email(email, f"⚠️ Follow-up: {subject}", late_email_html)
-    
-    if phone:
-        late_sms = f"⚠️ FOLLOW-UP REMINDER\n\n\"{subject}\" was scheduled for {format_datetime(datetime_str)}.\n\nDid you attend? If you missed it, please reschedule."
-        send_sms(phone, late_sms)
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            print(f"⚠️ Could not preload {name}: {e}")
+            continue
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        files[name] = (data, mimetype, hashlib.md5(data).hexdigest())
+    return files
+
+_frontend_cache = _load_frontend_files()
+
+def _serve_cached(name):
+    """Serve a preloaded front-end file, honouring If-None-Match"""
+    data, mimetype, etag = _frontend_cache[name]
+    response = Response(data, mimetype=mimetype)
+    response.set_etag(etag)
+    return response.make_conditional(request)
 
 @app.route('/')
 def index():
     """Serve the main HTML page"""
+    if 'index.html' in _frontend_cache:
+        return _serve_cached('index.html')
     return send_from_directory('.', 'index.html')
 
 @app.route('/<path:path>')
 def serve_static(path):
-    """Serve static files"""
+    """Serve the front-end files (and nothing else from the app directory)"""
+    if path in _frontend_cache:
+        return _serve_cached(path)
+    if path not in FRONTEND_FILES:
+        abort(404)
     return send_from_directory('.', path)
 
+# Static part of the health response — only the timestamp changes per call
+HEALTH_BASE = {
+    'status': 'OK',
+    'email_configured': CONFIG.email_user is not None,
+    'sms_enabled': sms_enabled,
+    'llm_enabled': llm_enabled
+}
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
-        'status': 'OK',
-        'timestamp': datetime.now().isoformat(),
-        'email_configured': EMAIL_USER is not None,
-        'sms_enabled': sms_enabled,
-        'llm_enabled': llm_enabled
-    })
+    return jsonify({**HEALTH_BASE, 'timestamp': datetime.now().isoformat()})
 
 @app.route('/api/parse-message', methods=['POST'])
 def parse_natural_language():
@@ -362,65 +200,47 @@ def parse_natural_language():
 def schedule_appointment():
     """Schedule a new appointment with email/SMS notifications"""
     try:
-        data = request.json
-        appointment_datetime = data.get('dateTime')
-        subject = data.get('subject')
-        email = data.get('email')
-        phone = data.get('phone')
-        
-        if not appointment_datetime or not subject:
-            return jsonify({'error': 'Missing required fields'}), 400
+        try:
+            payload = ScheduleRequest.model_validate_json(request.get_data())
+        except ValidationError as e:
+            errors = e.errors(include_url=False, include_context=False)
+            if any(err['type'] == 'missing' or err.get('input') in (None, '') for err in errors):
+                message = 'Missing required fields'
+            else:
+                message = errors[0]['msg'].removeprefix('Value error, ')
+            details = [{'loc': err['loc'], 'msg': err['msg'], 'type': err['type']} for err in errors]
+            return jsonify({'error': message, 'details': details}), 400
+        subject = payload.subject
+        email = payload.email
+        phone = payload.phone
 
         # Generate appointment ID
         appointment_id = f"{datetime.now().timestamp()}"
 
+        # Parsed once by ScheduleRequest (already normalized to UTC); passed through to every notification
+        reminder_time = payload.dateTime
+
         # Return success immediately — emails/SMS fire in background threads
         # This prevents Gunicorn worker timeouts on Render
-        def send_notifications():
-            # Send confirmation email
-            if email:
-                confirmation_html = f"""
-                <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-                    <h2 style="color: #6366f1;">✅ Appointment Confirmed</h2>
-                    <p>Your appointment has been successfully scheduled!</p>
-                    <div style="background: #f1f5f9; padding: 20px; border-radius: 10px; margin: 20px 0;">
-                        <h3 style="margin-top: 0; color: #334155;">Appointment Details</h3>
-                        <p><strong>Subject:</strong> {subject}</p>
-                        <p><strong>Date & Time:</strong> {format_datetime(appointment_datetime)}</p>
-                    </div>
-                    <p>You will receive a reminder notification at the scheduled time.</p>
-                    <p style="color: #64748b; font-size: 14px;">- Your Appointment Bot</p>
-                </div>
-                """
-                send_email(email, f"Appointment Confirmed: {subject}", confirmation_html)
-
-            # Send confirmation SMS
-            if phone:
-                confirmation_sms = f"✅ Appointment confirmed!\n\n\"{subject}\"\n{format_datetime(appointment_datetime)}\n\nYou'll receive a reminder at the scheduled time."
-                send_sms(phone, confirmation_sms)
-
-        t = threading.Thread(target=send_notifications, daemon=True)
-        t.start()
+        send_confirmation(subject, email, phone, reminder_time)
 
         # Schedule reminder job
-        reminder_time = datetime.fromisoformat(appointment_datetime.replace('Z', '+00:00'))
-        
         # Log clearly for debugging timezones on Render
         try:
-            from datetime import timezone
             now_utc = datetime.now(timezone.utc)
             print(f"[SCHEDULER] Current Server Time (UTC): {now_utc}")
             print(f"[SCHEDULER] Job scheduled for (UTC):   {reminder_time}")
         except: pass
 
-        job = scheduler.add_job(
+        scheduler.add_job(
             send_reminder,
             'date',
+            id=appointment_id,
+            replace_existing=True,
             run_date=reminder_time,
-            args=[appointment_id, subject, email, phone, appointment_datetime],
+            args=[appointment_id, subject, email, phone, reminder_time],
             misfire_grace_time=3600  # If server wakes up, still send missed within 1h
         )
-        scheduled_jobs[appointment_id] = job
 
         return jsonify({
             'success': True,
@@ -436,21 +256,20 @@ def schedule_appointment():
 def cancel_appointment(appointment_id):
     """Cancel a scheduled appointment"""
     try:
-        if appointment_id in scheduled_jobs:
-            scheduled_jobs[appointment_id].remove()
-            del scheduled_jobs[appointment_id]
-            return jsonify({'success': True, 'message': 'Appointment cancelled'})
-        else:
-            return jsonify({'error': 'Appointment not found'}), 404
+        scheduler.remove_job(appointment_id)
+        return jsonify({'success': True, 'message': 'Appointment cancelled'})
+    except JobLookupError:
+        return jsonify({'error': 'Appointment not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Local development only — production runs under gunicorn (see render.yaml)
 if __name__ == '__main__':
-    port = int(os.getenv('PORT', 10000))
+    port = CONFIG.port
     print(f"\n{'='*60}")
     print(f"🚀 Appointment Reminder Bot Server Starting...")
     print(f"{'='*60}")
-    print(f"📧 Email notifications: {'✅ Enabled' if EMAIL_USER else '❌ Disabled'}")
+    print(f"📧 Email notifications: {'✅ Enabled' if CONFIG.email_user else '❌ Disabled'}")
     print(f"📱 SMS notifications: {'✅ Enabled' if sms_enabled else '❌ Disabled'}")
     print(f"{'='*60}")
     print(f"🌐 Access your bot at: http://localhost:{port}")
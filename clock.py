@@ -0,0 +1,51 @@
+"""
+Second-granularity wall clock for hot paths (cache keys, date parsing, validation)
+"""
+
+import time
+from datetime import date, datetime, timedelta
+from typing import NamedTuple, Optional
+
+
+class NowSnapshot(NamedTuple):
+    """Local time truncated to the second, plus the derived values callers need"""
+    timestamp: int
+    now: datetime
+    today: date
+    today_iso: str
+    tomorrow_iso: str
+
+
+class _NowCache:
+    """Recomputes the snapshot at most once per second.
+
+    The snapshot is an immutable tuple swapped in with a single assignment,
+    so readers on other threads never see a half-built value.
+    """
+
+    def __init__(self):
+        self._snapshot: Optional[NowSnapshot] = None
+
+    def get(self) -> NowSnapshot:
+        second = int(time.time())
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.timestamp != second:
+            now = datetime.fromtimestamp(second)
+            today = now.date()
+            snapshot = NowSnapshot(
+                timestamp=second,
+                now=now,
+                today=today,
+                today_iso=today.isoformat(),
+                tomorrow_iso=(today + timedelta(days=1)).isoformat(),
+            )
+            self._snapshot = snapshot
+        return snapshot
+
+
+_now_cache = _NowCache()
+
+
+def now() -> NowSnapshot:
+    """Current local time snapshot (at most one second stale)"""
+    return _now_cache.get()
@@ -0,0 +1,77 @@
+"""
+Application configuration, read once from environment variables
+"""
+
+import logging
+import os
+from dataclasses import dataclass
+from typing import Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Databases (job store, LLM cache) live here, outside the directory the
+# front-end is served from
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
+
+
+def _log_level(name: str) -> str:
+    """Validate LOG_LEVEL; a typo falls back to INFO instead of breaking startup"""
+    level = name.strip().upper()
+    if level in logging.getLevelNamesMapping():
+        return level
+    print(f"⚠️ Unknown LOG_LEVEL {name!r}, using INFO")
+    return 'INFO'
+
+
+@dataclass(frozen=True)
+class Config:
+    """Immutable snapshot of the environment taken at startup"""
+    email_user: Optional[str]           # used as sender address
+    email_password: Optional[str]       # Gmail App Password (local dev only)
+    sendgrid_api_key: Optional[str]     # Use on Render (SMTP blocked on free tier)
+    resend_api_key: Optional[str]
+    gemini_api_key: Optional[str]
+    twilio_account_sid: Optional[str]
+    twilio_auth_token: Optional[str]
+    twilio_phone_number: Optional[str]
+    data_dir: str
+    jobstore_url: str
+    llm_cache_path: str                 # SQLite file for the persistent LLM cache ("" disables it)
+    log_level: str
+    port: int
+
+    @classmethod
+    def from_env(cls) -> "Config":
+        """Build a Config from the current environment"""
+        data_dir = os.getenv('DATA_DIR', DEFAULT_DATA_DIR)
+        os.makedirs(data_dir, exist_ok=True)
+        return cls(
+            email_user=os.getenv('EMAIL_USER'),
+            email_password=os.getenv('EMAIL_PASSWORD'),
+            sendgrid_api_key=os.getenv('SENDGRID_API_KEY'),
+            resend_api_key=os.getenv('RESEND_API_KEY'),
+            gemini_api_key=os.getenv('GEMINI_API_KEY'),
+            twilio_account_sid=os.getenv('TWILIO_ACCOUNT_SID'),
+            twilio_auth_token=os.getenv('TWILIO_AUTH_TOKEN'),
+            twilio_phone_number=os.getenv('TWILIO_PHONE_NUMBER'),
+            data_dir=data_dir,
+            jobstore_url=os.getenv('JOBSTORE_URL', 'sqlite:///' + os.path.join(data_dir, 'jobs.db')),
+            llm_cache_path=os.getenv('LLM_CACHE_DB', os.path.join(data_dir, 'llm_cache.db')),
+            log_level=_log_level(os.getenv('LOG_LEVEL') or 'INFO'),
+            port=int(os.getenv('PORT', 10000)),
+        )
+
+    @property
+    def email_enabled(self) -> bool:
+        """Whether any email transport (Resend, SendGrid, Gmail SMTP) is configured"""
+        return bool(self.resend_api_key or self.sendgrid_api_key or (self.email_user and self.email_password))
+
+    @property
+    def twilio_configured(self) -> bool:
+        """Whether all Twilio credentials are present"""
+        return bool(self.twilio_account_sid and self.twilio_auth_token and self.twilio_phone_number)
+
+
+CONFIG = Config.from_env()
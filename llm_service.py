@@ -3,18 +3,37 @@ LLM Service for Natural Language Appointment Extraction
 Uses Google Gemini API with structured JSON output
 """
 
-import os
-import json
-from datetime import datetime, timedelta
+import re
+import asyncio
+import atexit
+import functools
+import hashlib
+import logging
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
 from typing import Optional, List
-from pydantic import BaseModel, Field, ValidationError
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+import orjson
 import google.generativeai as genai
-from tenacity import retry, stop_after_attempt, wait_exponential
+from google.generativeai import client as genai_client
+from google.api_core.exceptions import DeadlineExceeded, ResourceExhausted, ServiceUnavailable
 from dateutil import parser as date_parser
+from validators import parse_date
+import clock
+from config import CONFIG
+
+log = logging.getLogger(__name__)
 
 
 class AppointmentExtraction(BaseModel):
     """Structured schema for appointment extraction"""
+    # Unknown keys from the model are dropped and strings are stripped inside pydantic-core
+    model_config = ConfigDict(extra='ignore', str_strip_whitespace=True)
+    
     date: Optional[str] = Field(None, description="Date in YYYY-MM-DD format")
     time: Optional[str] = Field(None, description="Time in HH:MM format (24-hour)")
     subject: Optional[str] = Field(None, description="Appointment subject/title")
@@ -24,28 +43,280 @@ class AppointmentExtraction(BaseModel):
     error: Optional[str] = Field(None, description="Error message if extraction failed")
 
 
-class LLMService:
-    """Production-grade LLM service with structured output"""
-    
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize Gemini API client"""
-        self.api_key = api_key or os.getenv('GEMINI_API_KEY')
-        if not self.api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
-        
-        genai.configure(api_key=self.api_key)
-        # Use Gemini 2.0 Flash Exp - unlimited free tier
-        self.model = genai.GenerativeModel('gemini-3-flash-preview')
-        self.enabled = True
-        print("✅ LLM Service initialized with Gemini 3 Flash Preview")
-    
-    def _get_system_prompt(self) -> str:
-        """Get system prompt for appointment extraction"""
-        today = datetime.now()
-        return f"""You are an appointment scheduling assistant. Extract appointment details from natural, casual user messages.
+def _fresh_copy(extraction: AppointmentExtraction) -> AppointmentExtraction:
+    """Cheap copy of a shared result: missing_fields is the only mutable field"""
+    return extraction.model_copy(update={'missing_fields': list(extraction.missing_fields)})
+
+
+# Fixed results built once at import and handed out via _fresh_copy
+_TOO_SHORT_RESULT = AppointmentExtraction(
+    confidence=0.0,
+    error="Message too short",
+    clarification_needed="Please describe your appointment (e.g., 'Dentist tomorrow at 3pm')"
+)
+_RETRY_RESULT = AppointmentExtraction(
+    confidence=0.0,
+    error="Failed to extract appointment details",
+    clarification_needed="Could you please rephrase your appointment request?"
+)
+# Template for Gemini call failures; the error text is filled in per failure
+_LLM_ERROR_RESULT = AppointmentExtraction(
+    confidence=0.0,
+    error="LLM service error",
+    clarification_needed="I'm having trouble understanding. Could you please rephrase using format: 'Subject on Date at Time'?"
+)
+_NO_DATETIME_RESULT = AppointmentExtraction(
+    confidence=0.0,
+    missing_fields=["date", "time"],
+    clarification_needed="When is the appointment? Please include a date and time (e.g., 'Dentist tomorrow at 3pm')"
+)
+
+# Cheap pre-check: a message with no digit and no date/time word cannot yield a
+# date or time, so it is answered without a Gemini round-trip
+_DATETIME_HINT_RE = re.compile(
+    r"\d|\b(?:today|tonight|tomorrow|tmrw?|yesterday|noon|midnight|morning|afternoon|evening|night"
+    r"|mon|tue|wed|thu|fri|sat|sun|weekend|week|month|year|day|hour|minute|next|this"
+    r"|jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec|one|two|three|four|five"
+    r"|six|seven|eight|nine|ten|eleven|twelve)",
+    re.IGNORECASE
+)
+
+
+# Exact-match cache for successful extractions (identical retries and
+# boilerplate phrasings skip the Gemini round-trip)
+EXTRACTION_CACHE_SIZE = 5000
+EXTRACTION_CACHE_TTL = 3600  # seconds
+# Bump whenever the prompt changes so cached answers from the old prompt are not reused
+PROMPT_VERSION = "v3"
+
+# Answers to "in 2 hours", "in 30 mins", "later today" depend on the time of day,
+# so messages like these are never cached (the key only carries the date)
+_TIME_RELATIVE_RE = re.compile(
+    r"\b(?:hours?|hrs?|minutes?|mins?|later|now|soon|shortly|asap)\b|\d+\s*(?:h|m)\b",
+    re.IGNORECASE
+)
+
+# On-disk second level behind the in-memory cache, so restarts start warm
+PERSISTENT_CACHE_TTL = 7 * 24 * 3600  # seconds
+PERSISTENT_CACHE_PRUNE_EVERY = 500  # writes between expired-row sweeps
+
+# Max messages packed into a single batched Gemini request
+BATCH_SIZE = 16
+
+# Response schema for batched requests: a JSON array of AppointmentExtraction
+# objects. Written out by hand because the SDK's schema converter rejects
+# the $ref that pydantic emits for List[AppointmentExtraction].
+_NULLABLE_STRING = {'type': 'string', 'nullable': True}
+BATCH_RESPONSE_SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': {
+            'date': _NULLABLE_STRING,
+            'time': _NULLABLE_STRING,
+            'subject': _NULLABLE_STRING,
+            'confidence': {'type': 'number'},
+            'missing_fields': {'type': 'array', 'items': {'type': 'string'}},
+            'clarification_needed': _NULLABLE_STRING,
+            'error': _NULLABLE_STRING,
+        },
+        'required': ['confidence', 'missing_fields'],
+    },
+}
+
+# Max Gemini requests in flight at once when fanning out with extract_many (stays under the 429 quota)
+MAX_CONCURRENT_EXTRACTIONS = 16
+
+# Rule-based fast path for the common "subject + day + time" shape
+# ("dentist tomorrow at 3pm", "gym next monday 07:30"); anything else goes to Gemini
+_WEEKDAY_NAMES = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+_WEEKDAYS = {name: index for index, name in enumerate(_WEEKDAY_NAMES)}
+# Relative day words resolved by table lookup instead of dateutil
+_RELATIVE_DAY_OFFSETS = {'yesterday': -1, 'today': 0, 'tonight': 0, 'tomorrow': 1, 'tmrw': 1}
+_FAST_TIME_RE = re.compile(
+    r"\b(?:(\d{1,2})(?::(\d{2}))?\s*([ap])\.?m\.?|(\d{1,2}):(\d{2})|(noon))(?![\w:])",
+    re.IGNORECASE
+)
+_FAST_DAY_RE = re.compile(
+    r"\b(?:(today|tonight|tomorrow|tmrw)|(?:(next|this)\s+)?(" + '|'.join(_WEEKDAY_NAMES) + r"))\b",
+    re.IGNORECASE
+)
+# Leftover words that mean the message is more than a single day + time
+_FAST_AMBIGUOUS_RE = re.compile(
+    r"\d|\b(?:every|each|daily|weekly|monthly|before|after|until|till|between|except|not|cancel"
+    r"|reschedule|o'?clock|midnight|morning|afternoon|evening|night|weekend|days?|weeks?|months?"
+    r"|years?|hours?|minutes?|mins?|hrs?|january|february|march|april|may|june|july|august"
+    r"|september|october|november|december)\b",
+    re.IGNORECASE
+)
+_FAST_PREFIX_RE = re.compile(
+    r"^(?:please\s+)?(?:remind\s+me\s+(?:to|about|of)[\s:]+|(?:schedule|book|set|add)[\s:]+(?:an?\s+|my\s+)?)",
+    re.IGNORECASE
+)
+_FAST_CONNECTORS = frozenset({'at', 'on', 'for', 'by', 'around', '@', ',', '-'})
+# Punctuation/whitespace left at the edges once the day and time are cut out
+_FAST_EDGE_RE = re.compile(r"^[\W_]+|[\W_]+$")
+
+# Gemini retries: only errors worth retrying (overload, quota, timeout); bad JSON,
+# auth and invalid-request errors fail fast
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 2.0  # seconds, doubled per attempt
+RETRY_MAX_DELAY = 10.0
+_TRANSIENT_ERRORS = (ServiceUnavailable, ResourceExhausted, DeadlineExceeded)
+
+# Markdown code fence the model sometimes wraps its JSON in
+_FENCE_RE = re.compile(r'^```(?:json)?\s*|\s*```$', re.MULTILINE)
+
+
+def _retry_delay(attempt: int) -> float:
+    """Exponential backoff with jitter so concurrent callers don't retry in lockstep"""
+    delay = min(RETRY_BASE_DELAY * (2 ** attempt), RETRY_MAX_DELAY)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _with_retries(call, attempts: int = RETRY_ATTEMPTS):
+    """Run call(), retrying transient Gemini errors with backoff"""
+    for attempt in range(attempts):
+        try:
+            return call()
+        except _TRANSIENT_ERRORS as e:
+            if attempt == attempts - 1:
+                raise
+            delay = _retry_delay(attempt)
+            print(f"⚠️  Transient Gemini error ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+async def _with_retries_async(call, attempts: int = RETRY_ATTEMPTS):
+    """Async variant of _with_retries: call() returns an awaitable"""
+    for attempt in range(attempts):
+        try:
+            return await call()
+        except _TRANSIENT_ERRORS as e:
+            if attempt == attempts - 1:
+                raise
+            delay = _retry_delay(attempt)
+            print(f"⚠️  Transient Gemini error ({e}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+class ExtractionCache:
+    """Thread-safe LRU cache with per-entry TTL"""
+
+    def __init__(self, maxsize: int = EXTRACTION_CACHE_SIZE, ttl: float = EXTRACTION_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[float, AppointmentExtraction]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[AppointmentExtraction]:
+        """Return a copy of the cached extraction, or None on miss/expiry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, extraction = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return _fresh_copy(extraction)
+
+    def put(self, key: str, extraction: AppointmentExtraction) -> None:
+        """Store a copy of the extraction, evicting the least recently used entry"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, extraction.model_copy(deep=True))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
+
 
-Current date and time: {today.strftime('%A, %B %d, %Y at %I:%M %p')}
-Current date: {today.strftime('%Y-%m-%d')}
+class PersistentCache:
+    """SQLite-backed extraction cache that survives process restarts.
+
+    Errors are logged and treated as misses so a broken cache file never
+    breaks extraction.
+    """
+
+    def __init__(self, path: str, ttl: int = PERSISTENT_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA mmap_size=268435456")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, response BLOB NOT NULL, "
+            "created_at INTEGER NOT NULL, expires_at INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_expires_at ON llm_cache(expires_at)")
+        self.prune()
+
+    def get(self, key: str) -> Optional[AppointmentExtraction]:
+        """Return the stored extraction, or None on miss/expiry/error"""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT response FROM llm_cache WHERE key = ? AND expires_at >= ?",
+                    (key, int(time.time()))
+                ).fetchone()
+            if row is None:
+                return None
+            return AppointmentExtraction.model_validate(orjson.loads(row[0]))
+        except (sqlite3.Error, orjson.JSONDecodeError, ValidationError) as e:
+            print(f"⚠️  Persistent cache read failed: {e}")
+            return None
+
+    def put(self, key: str, extraction: AppointmentExtraction, ttl: Optional[int] = None) -> None:
+        """Store the extraction for ttl seconds (defaults to the cache TTL)"""
+        now = int(time.time())
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, response, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, orjson.dumps(extraction.model_dump(exclude_none=True)), now, now + (ttl or self.ttl))
+                )
+                self._writes += 1
+                prune_due = self._writes % PERSISTENT_CACHE_PRUNE_EVERY == 0
+            if prune_due:
+                self.prune()
+        except sqlite3.Error as e:
+            print(f"⚠️  Persistent cache write failed: {e}")
+
+    def prune(self) -> None:
+        """Delete expired rows"""
+        try:
+            with self._lock:
+                self._conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (int(time.time()),))
+        except sqlite3.Error as e:
+            print(f"⚠️  Persistent cache prune failed: {e}")
+
+    def invalidate(self) -> None:
+        """Drop every stored entry"""
+        try:
+            with self._lock:
+                self._conn.execute("DELETE FROM llm_cache")
+        except sqlite3.Error as e:
+            print(f"⚠️  Persistent cache clear failed: {e}")
+
+    def close(self) -> None:
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
+
+# Static part of the prompt. Sent as the model's system instruction so it is
+# a byte-identical prefix on every request, which lets Gemini's implicit
+# context caching reuse it instead of re-processing it per call.
+SYSTEM_INSTRUCTION = """You are an appointment scheduling assistant. Extract appointment details from natural, casual user messages.
 
 RULES:
 1. Accept any date — past, present, or future. Never reject a date.
@@ -59,7 +330,7 @@ RULES:
 9. Be lenient and intelligent — try your best to extract something useful
 
 Return ONLY valid JSON matching this schema:
-{{
+{
     "date": "YYYY-MM-DD or null",
     "time": "HH:MM or null",
     "subject": "appointment subject or null",
@@ -67,68 +338,308 @@ Return ONLY valid JSON matching this schema:
     "missing_fields": ["field1", "field2"],
     "clarification_needed": "question to ask user or null",
     "error": "error message or null"
-}}
+}
+"""
+
+# Per-request tail of the prompt, appended to the cached dated prefix. The
+# time of day lives here (not in the prefix) so "in 2 hours" can be resolved
+# while the prefix stays byte-identical all day.
+_PROMPT_SUFFIX_TMPL = '\n\nCurrent time: {}\n\nUser message: "{}"\n\nExtract appointment details and respond with valid JSON only:'
+_PROMPT_TIME_FMT = '%I:%M %p'
+
+# API key genai was last configured with (genai.configure resets the SDK's global clients)
+_configured_api_key: Optional[str] = None
+
+
+def _configure_genai(api_key: str) -> None:
+    """Configure the SDK once per process (again only if the key changes)"""
+    global _configured_api_key
+    if _configured_api_key != api_key:
+        genai.configure(api_key=api_key)
+        _configured_api_key = api_key
+
+
+@functools.cache
+def _get_model(model_name: str, api_key: str) -> genai.GenerativeModel:
+    """One GenerativeModel per (model name, API key), shared by LLMService instances.
+
+    A GenerativeModel binds the SDK's client for the key configured at its
+    first call, so a model must never be shared across keys.
+    """
+    return genai.GenerativeModel(model_name, system_instruction=SYSTEM_INSTRUCTION)
+
+
+class LLMService:
+    """Production-grade LLM service with structured output"""
+    
+    def __init__(self, api_key: Optional[str] = None):
+        """Initialize Gemini API client"""
+        self.api_key = api_key or CONFIG.gemini_api_key
+        if not self.api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment variables")
+        
+        _configure_genai(self.api_key)
+        # Use Gemini 2.0 Flash Exp - unlimited free tier
+        self.model_name = 'gemini-3-flash-preview'
+        self.model = _get_model(self.model_name, self.api_key)
+        self._gen_config = genai.GenerationConfig(
+            temperature=0.1,
+            response_mime_type="application/json"
+        )
+        self._batch_gen_config = genai.GenerationConfig(
+            temperature=0.1,
+            response_mime_type="application/json",
+            response_schema=BATCH_RESPONSE_SCHEMA
+        )
+        self.cache = ExtractionCache()
+        self.persistent_cache: Optional[PersistentCache] = None
+        if CONFIG.llm_cache_path:
+            try:
+                self.persistent_cache = PersistentCache(CONFIG.llm_cache_path)
+            except sqlite3.Error as e:
+                print(f"⚠️  Persistent LLM cache disabled: {e}")
+        # Dated prompt prefix, rebuilt once per calendar day
+        self._prompt_cache: tuple = (None, "")
+        self.enabled = True
+        # One shared generative client (and its HTTP/2 gRPC channel) for every call;
+        # open it in the background so the first user request skips the TLS handshake
+        self._client = genai_client.get_default_generative_client()
+        threading.Thread(target=self._prewarm, name="llm-prewarm", daemon=True).start()
+        atexit.register(self.close)
+        print("✅ LLM Service initialized with Gemini 3 Flash Preview")
+
+    def _prewarm(self) -> None:
+        """Open the connection to the Gemini API with a cheap count_tokens call"""
+        try:
+            self.model.count_tokens("ping")
+            print("✅ Gemini connection warmed up")
+        except Exception as e:
+            print(f"⚠️  Gemini prewarm failed: {e}")
+
+    def close(self) -> None:
+        """Close the shared transport so pooled connections are drained on shutdown"""
+        try:
+            self._client.transport.close()
+        except Exception as e:
+            print(f"⚠️  Error closing Gemini transport: {e}")
+        if self.persistent_cache:
+            self.persistent_cache.close()
+    
+    def _get_system_prompt(self) -> str:
+        """Get the date-dependent part of the prompt (static rules live in SYSTEM_INSTRUCTION).
+
+        Only the calendar date goes in, so the text is byte-identical for the whole
+        day and Gemini's implicit prefix caching can reuse it across requests.
+        """
+        now = clock.now()
+        today = now.today
+        cached_day, cached_prompt = self._prompt_cache
+        if cached_day == today:
+            return cached_prompt
+        
+        tomorrow = now.tomorrow_iso
+        prompt = f"""Today is {today.strftime('%A, %B %d, %Y')}
+Current date: {now.today_iso}
 
 Examples:
-- "tomorrow 12pm meeting for dentist" → {{"date": "{(today + timedelta(days=1)).strftime('%Y-%m-%d')}", "time": "12:00", "subject": "Dentist appointment", "confidence": 0.95, "missing_fields": [], "clarification_needed": null}}
-- "dentist tomorrow at 3pm" → {{"date": "{(today + timedelta(days=1)).strftime('%Y-%m-%d')}", "time": "15:00", "subject": "Dentist appointment", "confidence": 0.95, "missing_fields": [], "clarification_needed": null}}
-- "today 5:47pm meeting" → {{"date": "{today.strftime('%Y-%m-%d')}", "time": "17:47", "subject": "Meeting", "confidence": 0.9, "missing_fields": [], "clarification_needed": null}}
+- "tomorrow 12pm meeting for dentist" → {{"date": "{tomorrow}", "time": "12:00", "subject": "Dentist appointment", "confidence": 0.95, "missing_fields": [], "clarification_needed": null}}
+- "dentist tomorrow at 3pm" → {{"date": "{tomorrow}", "time": "15:00", "subject": "Dentist appointment", "confidence": 0.95, "missing_fields": [], "clarification_needed": null}}
+- "today 5:47pm meeting" → {{"date": "{now.today_iso}", "time": "17:47", "subject": "Meeting", "confidence": 0.9, "missing_fields": [], "clarification_needed": null}}
 - "gym session next Monday 7am" → {{"date": "[calculate next Monday]", "time": "07:00", "subject": "Gym session", "confidence": 0.95, "missing_fields": [], "clarification_needed": null}}
 - "meeting next Monday" → {{"date": "[calculate next Monday]", "time": null, "confidence": 0.7, "missing_fields": ["time"], "clarification_needed": "What time is the meeting?"}}
 """
+        self._prompt_cache = (today, prompt)
+        return prompt
+    
+    def _build_prompt(self, user_message: str) -> str:
+        """Cached dated prefix followed by the per-request user message suffix"""
+        current_time = clock.now().now.strftime(_PROMPT_TIME_FMT)
+        return self._get_system_prompt() + _PROMPT_SUFFIX_TMPL.format(current_time, user_message)
     
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
     def _call_gemini_api(self, user_message: str) -> dict:
         """Call Gemini API with retry logic"""
         try:
-            prompt = f"""{self._get_system_prompt()}
-
-User message: "{user_message}"
-
-Extract appointment details and respond with valid JSON only:"""
+            prompt = self._build_prompt(user_message)
             
-            response = self.model.generate_content(
+            response = _with_retries(lambda: self.model.generate_content(
                 prompt,
-                generation_config=genai.GenerationConfig(
-                    temperature=0.1,
-                    response_mime_type="application/json"
-                )
-            )
+                generation_config=self._gen_config
+            ))
             
-            json_text = response.text.strip()
+            return self._parse_json_response(response.text)
+            
+        except Exception as e:
+            print(f"❌ Gemini API error: {e}")
+            raise
+    
+    async def _call_gemini_api_async(self, user_message: str) -> dict:
+        """Async Gemini API call with retry logic"""
+        try:
+            prompt = self._build_prompt(user_message)
             
-            # Handle markdown code blocks if present
-            if json_text.startswith("```"):
-                json_text = json_text.split("```")[1]
-                if json_text.startswith("json"):
-                    json_text = json_text[4:]
-                json_text = json_text.strip()
+            response = await _with_retries_async(lambda: self.model.generate_content_async(
+                prompt,
+                generation_config=self._gen_config
+            ))
             
-            return json.loads(json_text)
+            return self._parse_json_response(response.text)
             
         except Exception as e:
             print(f"❌ Gemini API error: {e}")
             raise
     
+    def _call_gemini_batch(self, user_messages: List[str]):
+        """Call Gemini API once for several messages (expects a JSON array back)"""
+        try:
+            numbered = "\n".join(f'{i}. "{msg}"' for i, msg in enumerate(user_messages, 1))
+            prompt = f"""{self._get_system_prompt()}
+
+Current time: {clock.now().now.strftime(_PROMPT_TIME_FMT)}
+
+Extract appointments for each of the following {len(user_messages)} user messages:
+{numbered}
+
+Respond with valid JSON only: a JSON array of exactly {len(user_messages)} objects, one per message, in the same order."""
+            
+            response = _with_retries(lambda: self.model.generate_content(
+                prompt,
+                generation_config=self._batch_gen_config
+            ))
+            
+            return self._parse_json_response(response.text)
+            
+        except Exception as e:
+            print(f"❌ Gemini batch API error: {e}")
+            raise
+    
+    @staticmethod
+    def _parse_json_response(text: str):
+        """Parse the model's JSON reply, tolerating a markdown code fence"""
+        json_text = _FENCE_RE.sub('', text.strip()).strip()
+        return orjson.loads(json_text)
+    
     def _parse_relative_date(self, date_str: str) -> Optional[str]:
         """Parse relative dates like 'tomorrow', 'next Monday'"""
+        if not date_str:
+            return None
+        
+        # Common shapes first: relative day words, (next|this) weekday, ISO dates
+        text = date_str.strip().lower()
+        today = clock.now().today
+        offset = _RELATIVE_DAY_OFFSETS.get(text)
+        if offset is not None:
+            return (today + timedelta(days=offset)).isoformat()
+        
+        qualifier, _, name = text.rpartition(' ')
+        weekday = _WEEKDAYS.get(name)
+        if weekday is not None and qualifier in ('', 'this', 'next'):
+            offset = (weekday - today.weekday()) % 7
+            if qualifier == 'next' and offset == 0:
+                offset = 7
+            return (today + timedelta(days=offset)).isoformat()
+        
+        try:
+            return parse_date(text).isoformat()
+        except ValueError:
+            pass
+        
+        # Anything else: dateutil's (slow) fuzzy parser
         try:
-            if not date_str:
-                return None
             parsed = date_parser.parse(date_str, fuzzy=True)
             return parsed.strftime('%Y-%m-%d')
         except Exception as e:
             print(f"Date parsing error: {e}")
             return None
     
+    @staticmethod
+    def _fast_subject(user_message: str, spans: list) -> str:
+        """Message text outside the matched day/time spans, minus edge connectors
+
+        >>> msg = 'haircut: tomorrow 3pm'
+        >>> LLMService._fast_subject(msg, [(9, 17), (18, 21)])
+        'Haircut'
+        >>> msg = 'Is the dentist tomorrow at 3pm?'
+        >>> LLMService._fast_subject(msg, [(15, 23), (27, 30)])
+        'Is the dentist'
+        """
+        pieces = []
+        start = 0
+        for span_start, span_end in sorted(spans) + [(len(user_message), len(user_message))]:
+            words = user_message[start:span_start].split()
+            while words and words[0].lower() in _FAST_CONNECTORS:
+                words.pop(0)
+            while words and words[-1].lower() in _FAST_CONNECTORS:
+                words.pop()
+            pieces.extend(words)
+            start = span_end
+        subject = _FAST_EDGE_RE.sub('', ' '.join(pieces))
+        subject = _FAST_EDGE_RE.sub('', _FAST_PREFIX_RE.sub('', subject))
+        return subject[:1].upper() + subject[1:]
+    
+    def _try_fast_extract(self, user_message: str) -> Optional[AppointmentExtraction]:
+        """
+        Deterministic extraction for messages with exactly one day and one time
+        and nothing else date-like. Returns None whenever the message is
+        ambiguous, so the caller falls back to Gemini.
+        """
+        times = list(_FAST_TIME_RE.finditer(user_message))
+        days = list(_FAST_DAY_RE.finditer(user_message))
+        if len(times) != 1 or len(days) != 1:
+            return None
+        time_match, day_match = times[0], days[0]
+        
+        # Time
+        hour12, minute12, meridiem, hour24, minute24, noon = time_match.groups()
+        if noon:
+            hour, minute = 12, 0
+        elif meridiem:
+            hour, minute = int(hour12), int(minute12 or 0)
+            if not 1 <= hour <= 12:
+                return None
+            hour = hour % 12 + (12 if meridiem.lower() == 'p' else 0)
+        else:
+            hour, minute = int(hour24), int(minute24)
+            if hour > 23:
+                return None
+        if minute > 59:
+            return None
+        
+        # Day
+        today = clock.now().today
+        relative, qualifier, weekday = day_match.groups()
+        if relative:
+            relative = relative.lower()
+            if relative == 'tonight' and hour < 12:
+                return None
+            offset = 0 if relative in ('today', 'tonight') else 1
+        else:
+            offset = (_WEEKDAYS[weekday.lower()] - today.weekday()) % 7
+            if offset == 0:
+                # "monday" said on a Monday could mean today or a week out
+                if not qualifier or qualifier.lower() != 'next':
+                    return None
+                offset = 7
+        
+        subject = self._fast_subject(user_message, [time_match.span(), day_match.span()])
+        # Nothing but punctuation left: let Gemini work out what the reminder is for
+        if not subject or _FAST_AMBIGUOUS_RE.search(subject):
+            return None
+        
+        return AppointmentExtraction(
+            date=(today + timedelta(days=offset)).strftime('%Y-%m-%d'),
+            time=f"{hour:02d}:{minute:02d}",
+            subject=subject,
+            confidence=0.95,
+        )
+    
     def _validate_extraction(self, data: dict) -> AppointmentExtraction:
         """Validate and clean extracted data"""
         try:
-            extraction = AppointmentExtraction(**data)
+            extraction = AppointmentExtraction.model_validate(data)
             
             if extraction.date:
                 try:
-                    datetime.strptime(extraction.date, '%Y-%m-%d').date()  # just validate format
+                    parse_date(extraction.date)  # just validate format
                 except ValueError:
                     extraction.error = "Invalid date format"
                     extraction.missing_fields.append("date")
@@ -149,36 +660,176 @@ Extract appointment details and respond with valid JSON only:"""
             
         except ValidationError as e:
             print(f"Validation error: {e}")
-            return AppointmentExtraction(
-                confidence=0.0,
-                error="Failed to extract appointment details",
-                clarification_needed="Could you please rephrase your appointment request?"
-            )
+            return _fresh_copy(_RETRY_RESULT)
+    
+    @staticmethod
+    def _normalize_message(user_message: str) -> str:
+        """Case/whitespace-insensitive form of a message for cache lookups.
+        Word order is kept: reordered words can change who or what the
+        appointment is about.
+
+        >>> LLMService._normalize_message("  Dentist   TOMORROW at 3pm ")
+        'dentist tomorrow at 3pm'
+        >>> (LLMService._normalize_message("remind John to call Mary tomorrow afternoon at 3pm")
+        ...  == LLMService._normalize_message("remind Mary to call John tomorrow afternoon at 3pm"))
+        False
+        """
+        return ' '.join(user_message.lower().split())
+    
+    def _cache_key(self, user_message: str) -> str:
+        """Cache key: prompt version + model + current date (so "tomorrow"
+        never resolves to a stale day) + normalized message"""
+        today = clock.now().today_iso
+        normalized = self._normalize_message(user_message)
+        return hashlib.sha256(f"{PROMPT_VERSION}|{self.model_name}|{today}|{normalized}".encode()).hexdigest()
+    
+    def invalidate_cache(self) -> None:
+        """Forget all cached extractions (e.g. in tests or after a prompt change)"""
+        self.cache.invalidate()
+        if self.persistent_cache:
+            self.persistent_cache.invalidate()
+    
+    def _cache_lookup(self, user_message: str) -> Optional[AppointmentExtraction]:
+        """In-memory cache first, then the on-disk cache"""
+        if _TIME_RELATIVE_RE.search(user_message):
+            return None
+        key = self._cache_key(user_message)
+        cached = self.cache.get(key)
+        if cached is None and self.persistent_cache:
+            cached = self.persistent_cache.get(key)
+            if cached is not None:
+                # Promote to the in-memory cache for the next hit
+                self.cache.put(key, cached)
+        return cached
+    
+    def _cache_store(self, user_message: str, extraction: AppointmentExtraction) -> None:
+        """Store a successful extraction in every cache layer"""
+        if _TIME_RELATIVE_RE.search(user_message):
+            return
+        key = self._cache_key(user_message)
+        self.cache.put(key, extraction)
+        if self.persistent_cache:
+            self.persistent_cache.put(key, extraction)
+    
+    def _early_result(self, user_message: str) -> Optional[AppointmentExtraction]:
+        """Answer without calling Gemini when possible: too-short input, no date/time
+        words at all, a simple message the rule-based path handles, or a cache hit"""
+        if not user_message or len(user_message.strip()) < 3:
+            return _fresh_copy(_TOO_SHORT_RESULT)
+        
+        if not _DATETIME_HINT_RE.search(user_message):
+            print("⚡ No date/time in message, skipping LLM")
+            return _fresh_copy(_NO_DATETIME_RESULT)
+        
+        fast = self._try_fast_extract(user_message)
+        if fast is not None:
+            print("⚡ Rule-based extraction, skipping LLM")
+            return fast
+        
+        cached = self._cache_lookup(user_message)
+        if cached is not None:
+            print("⚡ Extraction cache hit")
+        return cached
+    
+    def _finish_extraction(self, user_message: str, data) -> AppointmentExtraction:
+        """Validate raw model output and cache it if extraction succeeded"""
+        if not isinstance(data, dict):
+            # Array/scalar instead of an object — not a usable (or cacheable) answer
+            log.warning("Unexpected model output type: %s", type(data).__name__)
+            return _fresh_copy(_RETRY_RESULT)
+        extraction = self._validate_extraction(data)
+        print(f"📊 Extraction result: confidence={extraction.confidence}, missing={extraction.missing_fields}")
+        if extraction.error is None:
+            self._cache_store(user_message, extraction)
+        return extraction
+    
+    @staticmethod
+    def _llm_error_result(e: Exception) -> AppointmentExtraction:
+        """Response returned when the Gemini call itself failed"""
+        print(f"❌ LLM extraction failed: {e}")
+        return _LLM_ERROR_RESULT.model_copy(update={'error': f"LLM service error: {str(e)}", 'missing_fields': []})
     
     def extract_appointment_details(self, user_message: str) -> AppointmentExtraction:
         """
         Main method to extract appointment details from natural language
         """
-        if not user_message or len(user_message.strip()) < 3:
-            return AppointmentExtraction(
-                confidence=0.0,
-                error="Message too short",
-                clarification_needed="Please describe your appointment (e.g., 'Dentist tomorrow at 3pm')"
-            )
+        early = self._early_result(user_message)
+        if early is not None:
+            return early
         
         try:
             result = self._call_gemini_api(user_message)
-            extraction = self._validate_extraction(result)
-            print(f"📊 Extraction result: confidence={extraction.confidence}, missing={extraction.missing_fields}")
-            return extraction
-            
         except Exception as e:
-            print(f"❌ LLM extraction failed: {e}")
-            return AppointmentExtraction(
-                confidence=0.0,
-                error=f"LLM service error: {str(e)}",
-                clarification_needed="I'm having trouble understanding. Could you please rephrase using format: 'Subject on Date at Time'?"
-            )
+            return self._llm_error_result(e)
+        return self._finish_extraction(user_message, result)
+    
+    async def extract_appointment_details_async(self, user_message: str) -> AppointmentExtraction:
+        """
+        Async variant of extract_appointment_details — awaits Gemini instead of
+        blocking a thread, so many extractions can share one event loop
+        """
+        early = self._early_result(user_message)
+        if early is not None:
+            return early
+        
+        try:
+            result = await self._call_gemini_api_async(user_message)
+        except Exception as e:
+            return self._llm_error_result(e)
+        return self._finish_extraction(user_message, result)
+    
+    async def extract_many(self, user_messages: List[str]) -> List[AppointmentExtraction]:
+        """
+        Extract appointment details for independent messages concurrently,
+        with at most MAX_CONCURRENT_EXTRACTIONS Gemini requests in flight.
+        Results are returned in input order.
+        """
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_EXTRACTIONS)
+        
+        async def extract_one(msg: str) -> AppointmentExtraction:
+            async with semaphore:
+                return await self.extract_appointment_details_async(msg)
+        
+        return list(await asyncio.gather(*(extract_one(msg) for msg in user_messages)))
+    
+    def extract_appointment_details_batch(self, user_messages: List[str]) -> List[AppointmentExtraction]:
+        """
+        Extract appointment details for several messages, packing cache
+        misses into one Gemini request per BATCH_SIZE messages.
+        Results are returned in input order.
+        """
+        results: List[Optional[AppointmentExtraction]] = [None] * len(user_messages)
+        pending = []  # (index, message) still needing the LLM
+        
+        for i, msg in enumerate(user_messages):
+            results[i] = self._early_result(msg)
+            if results[i] is None:
+                pending.append((i, msg))
+        
+        for start in range(0, len(pending), BATCH_SIZE):
+            chunk = pending[start:start + BATCH_SIZE]
+            try:
+                raw_results = self._call_gemini_batch([msg for _, msg in chunk])
+                if not isinstance(raw_results, list) or len(raw_results) != len(chunk):
+                    raise ValueError(f"expected a JSON array of {len(chunk)} objects")
+            except (ValueError, orjson.JSONDecodeError) as e:
+                # Reply came back malformed (bad JSON, wrong shape) — fall back to one call per message
+                log.warning("Batch extraction reply unusable (%s), falling back to per-message calls", e)
+                for i, msg in chunk:
+                    results[i] = self.extract_appointment_details(msg)
+                continue
+            except Exception as e:
+                # API failure (already retried if transient) — retrying per message would
+                # only multiply the load on an overloaded/quota-limited API
+                log.warning("Batch extraction failed (%s) for %d messages", e, len(chunk))
+                for i, _ in chunk:
+                    results[i] = self._llm_error_result(e)
+                continue
+            
+            for (i, msg), data in zip(chunk, raw_results):
+                results[i] = self._finish_extraction(msg, data)
+        
+        return results
 
 
 # Singleton instance
@@ -0,0 +1,351 @@
+"""
+Email/SMS notifications and the reminder scheduler
+"""
+
+import atexit
+import logging
+import os
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from email.header import Header
+from email.utils import formataddr
+# twilio imported conditionally below (only if credentials provided)
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from config import CONFIG
+
+log = logging.getLogger(__name__)
+
+# Configuration
+IST = timezone(timedelta(hours=5, minutes=30))  # display timezone for notifications
+DATE_FMT = '%A, %B %d, %Y at %I:%M %p'
+# Detect which email method to use
+if CONFIG.sendgrid_api_key:
+    print("✅ Email via SendGrid API")
+elif CONFIG.email_user and CONFIG.email_password:
+    print("✅ Email via Gmail SMTP (local dev)")
+else:
+    print("ℹ️ Email notifications disabled")
+
+# Twilio is optional - only initialize if credentials provided
+twilio_client = None
+sms_enabled = False
+
+# Only initialize Twilio if all credentials are provided
+if CONFIG.twilio_configured:
+    try:
+        from twilio.rest import Client
+        from twilio.http.http_client import TwilioHttpClient
+        # One long-lived pooled requests.Session for all SMS sends (keep-alive,
+        # no TLS handshake per message); retries cover dropped connections
+        twilio_http = TwilioHttpClient(pool_connections=True, max_retries=3, timeout=30)
+        twilio_client = Client(CONFIG.twilio_account_sid, CONFIG.twilio_auth_token, http_client=twilio_http)
+        sms_enabled = True
+        print("✅ SMS notifications enabled")
+    except Exception as e:
+        print(f"⚠️ Twilio not available: {e}")
+        sms_enabled = False
+else:
+    print("ℹ️ SMS notifications disabled (no Twilio credentials)")
+
+# Scheduler for reminders — jobs persist in a SQLite job store so pending
+# reminders survive a process restart
+scheduler = BackgroundScheduler(
+    jobstores={'default': SQLAlchemyJobStore(url=CONFIG.jobstore_url)},
+    timezone=timezone.utc
+)
+scheduler.start()
+
+# Email bodies — compiled once at import, rendered per send
+_template_env = Environment(
+    loader=FileSystemLoader(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')),
+    autoescape=select_autoescape(['html']),
+    auto_reload=False
+)
+CONFIRMATION_TEMPLATE = _template_env.get_template('confirmation.html')
+REMINDER_TEMPLATE = _template_env.get_template('reminder.html')
+LATE_REMINDER_TEMPLATE = _template_env.get_template('late_reminder.html')
+
+# Gmail SMTP connection, reused across sends (TLS handshake + AUTH per
+# message dominated the confirmation/reminder/follow-up sends)
+_smtp_conn = None
+_smtp_lock = threading.Lock()
+
+def _connect_smtp():
+    """Open and authenticate a new Gmail SMTP_SSL connection"""
+    server = smtplib.SMTP_SSL('smtp.gmail.com', 465, timeout=30)
+    server.login(CONFIG.email_user, CONFIG.email_password)
+    return server
+
+def _get_smtp():
+    """Return the cached SMTP connection, reconnecting if it has gone stale.
+    Caller must hold _smtp_lock."""
+    global _smtp_conn
+    if _smtp_conn is not None:
+        try:
+            status, _ = _smtp_conn.noop()
+            if status == 250:
+                return _smtp_conn
+        except (smtplib.SMTPException, OSError):
+            pass
+        _close_smtp()
+    _smtp_conn = _connect_smtp()
+    return _smtp_conn
+
+def _close_smtp():
+    """Drop the cached SMTP connection (best effort QUIT)"""
+    global _smtp_conn
+    if _smtp_conn is not None:
+        try:
+            _smtp_conn.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        _smtp_conn = None
+
+atexit.register(_close_smtp)
+
+# Every SMTP email is a single text/html part from the same sender, so the
+# message is written out directly instead of built through email.mime
+RAW_EMAIL_HEADERS = (
+    "From: {sender}\r\n"
+    "To: {to}\r\n"
+    "Subject: {subject}\r\n"
+    "MIME-Version: 1.0\r\n"
+    "Content-Type: text/html; charset=utf-8\r\n"
+    "Content-Transfer-Encoding: 8bit\r\n"
+    "\r\n"
+)
+
+def _build_raw_email(to_email, subject, html_content):
+    """Serialize a single-part HTML email to RFC 5322 bytes"""
+    if '\r' in to_email or '\n' in to_email:
+        raise ValueError("Invalid recipient address")
+    # Subjects carry emoji — RFC 2047 encode them; newlines would inject headers
+    # (folded with CRLF: sendmail passes bytes through untouched)
+    subject = Header(' '.join(subject.splitlines()), 'utf-8').encode(linesep='\r\n')
+    headers = RAW_EMAIL_HEADERS.format(
+        sender=formataddr(("Appointment Bot", CONFIG.email_user)),
+        to=to_email,
+        subject=subject
+    )
+    body = html_content.replace('\r\n', '\n').replace('\n', '\r\n')
+    return headers.encode('ascii') + body.encode('utf-8')
+
+def _smtp_sendmail(server, to_email, raw):
+    """Send pre-serialized message bytes (8bit body needs 8BITMIME)"""
+    mail_options = ['BODY=8BITMIME'] if server.has_extn('8bitmime') else []
+    server.sendmail(CONFIG.email_user, [to_email], raw, mail_options=mail_options)
+
+def send_email(to_email, subject, html_content):
+    """Send email — Resend → SendGrid → SMTP (local) in order of preference"""
+    import urllib.request, json as _json
+
+    # ── 1. Resend API (easiest, works on Render free tier) ──────────────────
+    if CONFIG.resend_api_key:
+        try:
+            # Resend Free Tier: MUST send from onboarding@resend.dev (unless you verify a domain)
+            sender = "Appointment Bot <onboarding@resend.dev>"
+            params = {
+                "from": sender,
+                "to": [to_email],
+                "subject": subject,
+                "html": html_content
+            }
+            if CONFIG.email_user:
+                params["reply_to"] = CONFIG.email_user
+
+            payload = _json.dumps(params).encode()
+            req = urllib.request.Request(
+                "https://api.resend.com/emails",
+                data=payload,
+                headers={
+                    "Authorization": f"Bearer {CONFIG.resend_api_key}",
+                    "Content-Type": "application/json"
+                },
+                method="POST"
+            )
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                if resp.status in (200, 201):
+                    log.info("[EMAIL] ✅ Resend → %s", to_email)
+                    return True
+                log.error("[EMAIL] ❌ Resend status %s", resp.status)
+                return False
+        except Exception as e:
+            log.error("[EMAIL] ❌ Resend error: %s", e)
+            return False
+
+    # ── 2. SendGrid API ──────────────────────────────────────────────────────
+    if CONFIG.sendgrid_api_key:
+        try:
+            payload = _json.dumps({
+                "personalizations": [{"to": [{"email": to_email}]}],
+                "from": {"email": CONFIG.email_user or "noreply@appointmentbot.com", "name": "Appointment Bot"},
+                "subject": subject,
+                "content": [{"type": "text/html", "value": html_content}]
+            }).encode()
+            req = urllib.request.Request(
+                "https://api.sendgrid.com/v3/mail/send",
+                data=payload,
+                headers={
+                    "Authorization": f"Bearer {CONFIG.sendgrid_api_key}",
+                    "Content-Type": "application/json"
+                },
+                method="POST"
+            )
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                if resp.status in (200, 202):
+                    log.info("[EMAIL] ✅ SendGrid → %s", to_email)
+                    return True
+                log.error("[EMAIL] ❌ SendGrid status %s", resp.status)
+                return False
+        except Exception as e:
+            log.error("[EMAIL] ❌ SendGrid error: %s", e)
+            return False
+
+    # ── 3. Gmail SMTP — local dev only (blocked on Render free tier) ─────────
+    if not CONFIG.email_user or not CONFIG.email_password:
+        log.debug("[EMAIL] Skipped — no credentials configured")
+        return False
+    try:
+        raw = _build_raw_email(to_email, subject, html_content)
+        with _smtp_lock:
+            try:
+                _smtp_sendmail(_get_smtp(), to_email, raw)
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException, ConnectionError) as e:
+                # Server may drop idle connections (421 / reset) — retry once on a fresh one
+                if getattr(e, 'smtp_code', 421) != 421:
+                    raise
+                log.warning("[EMAIL] SMTP connection lost (%s), reconnecting", e)
+                _close_smtp()
+                _smtp_sendmail(_get_smtp(), to_email, raw)
+        log.info("[EMAIL] ✅ SMTP → %s", to_email)
+        return True
+    except Exception as e:
+        log.error("[EMAIL] ❌ SMTP error: %s", e)
+        return False
+
+def send_sms(to_phone, message):
+    """Send SMS using Twilio (if enabled)"""
+    if not sms_enabled or not twilio_client:
+        log.debug("[SMS] Not enabled - skipping")
+        return False
+        
+    try:
+        message = twilio_client.messages.create(
+            body=message,
+            from_=CONFIG.twilio_phone_number,
+            to=to_phone
+        )
+        log.info("[SMS] ✅ Sent to %s: %s", to_phone, message.sid)
+        return True
+    except Exception as e:
+        log.error("[SMS] ❌ Error sending SMS: %s", e)
+        return False
+
+# Failed notifications are re-queued on the scheduler instead of dropped
+NOTIFY_MAX_RETRIES = 3
+NOTIFY_RETRY_DELAY = timedelta(seconds=30)
+
+def _channel_configured(send_func):
+    """Whether a failed send is worth retrying (False = channel disabled)"""
+    if send_func is send_sms:
+        return sms_enabled
+    return CONFIG.email_enabled
+
+def deliver_notification(send_func, args, attempt=0):
+    """Run one email/SMS send; on failure schedule a retry after NOTIFY_RETRY_DELAY"""
+    if send_func(*args):
+        return True
+    if attempt < NOTIFY_MAX_RETRIES and _channel_configured(send_func):
+        retry_time = datetime.now(timezone.utc) + NOTIFY_RETRY_DELAY
+        scheduler.add_job(
+            deliver_notification,
+            'date',
+            run_date=retry_time,
+            args=[send_func, args, attempt + 1],
+            misfire_grace_time=3600
+        )
+        log.warning("[RETRY] %s failed — retry %d/%d at %s", send_func.__name__, attempt + 1, NOTIFY_MAX_RETRIES, retry_time)
+    return False
+
+# Shared worker pool for notification sends (replaces a thread per send)
+EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix='notif')
+atexit.register(EXECUTOR.shutdown, wait=True)
+
+def send_in_background(send_func, *args):
+    """Queue a blocking email/SMS send on EXECUTOR so the caller
+    (HTTP request or scheduler worker) does not wait on SMTP/Twilio"""
+    return EXECUTOR.submit(deliver_notification, send_func, args)
+
+def parse_iso_datetime(iso_string):
+    """Parse an ISO datetime string from the API (trailing 'Z' = UTC;
+    fromisoformat accepts it natively on Python 3.11+)"""
+    return datetime.fromisoformat(iso_string)
+
+@lru_cache(maxsize=1024)
+def format_datetime(dt):
+    """Format a datetime for display in IST timezone (memoized — the same
+    appointment time is formatted for every email/SMS it gets).
+    ISO strings are still accepted for jobs persisted before datetimes
+    were passed through."""
+    if isinstance(dt, str):
+        dt = parse_iso_datetime(dt)
+    # Convert to IST (UTC+5:30)
+    return dt.astimezone(IST).strftime(DATE_FMT)
+
+def send_reminder(appointment_id, subject, email, phone, appointment_time):
+    """Send reminder via email and SMS"""
+    log.info("Sending reminder for: %s", subject)
+    
+    # Send email reminder
+    if email:
+        email_html = REMINDER_TEMPLATE.render(subject=subject, scheduled_time=format_datetime(appointment_time))
+        send_in_background(send_email, email, f"⏰ Reminder: {subject}", email_html)
+    
+    # Send SMS reminder
+    if phone:
+        sms_message = f"⏰ APPOINTMENT REMINDER\n\n\"{subject}\"\n\nScheduled for: {format_datetime(appointment_time)}\n\nTime to get ready!"
+        send_in_background(send_sms, phone, sms_message)
+    
+    # Schedule follow-up "late" reminder for 2 minutes after
+    if email or phone:  # Send late reminder if email or phone is provided
+        if isinstance(appointment_time, str):
+            appointment_time = parse_iso_datetime(appointment_time)
+        late_reminder_time = appointment_time + timedelta(minutes=2)
+        
+        scheduler.add_job(
+            send_late_reminder,
+            'date',
+            run_date=late_reminder_time,
+            args=[subject, email, phone, appointment_time]
+        )
+        log.info("Late reminder scheduled for %s", late_reminder_time)
+
+def send_late_reminder(subject, email, phone, appointment_time):
+    """Send a follow-up reminder 2 minutes after appointment time via email and SMS"""
+    log.info("Sending late reminder for: %s", subject)
+    
+    if email:
+        late_email_html = LATE_REMINDER_TEMPLATE.render(subject=subject, scheduled_time=format_datetime(appointment_time))
+        send_in_background(send_email, email, f"⚠️ Follow-up: {subject}", late_email_html)
+    
+    if phone:
+        late_sms = f"⚠️ FOLLOW-UP REMINDER\n\n\"{subject}\" was scheduled for {format_datetime(appointment_time)}.\n\nDid you attend? If you missed it, please reschedule."
+        send_in_background(send_sms, phone, late_sms)
+
+def send_confirmation(subject, email, phone, appointment_time):
+    """Send appointment confirmation via email and SMS"""
+    # Send confirmation email
+    if email:
+        confirmation_html = CONFIRMATION_TEMPLATE.render(subject=subject, scheduled_time=format_datetime(appointment_time))
+        send_in_background(send_email, email, f"Appointment Confirmed: {subject}", confirmation_html)
+
+    # Send confirmation SMS
+    if phone:
+        confirmation_sms = f"✅ Appointment confirmed!\n\n\"{subject}\"\n{format_datetime(appointment_time)}\n\nYou'll receive a reminder at the scheduled time."
+        send_in_background(send_sms, phone, confirmation_sms)
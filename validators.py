@@ -3,8 +3,50 @@ Validation utilities for appointment data
 """
 
 import re
-from datetime import datetime
-from typing import Tuple
+from datetime import date, datetime, time, timezone
+from typing import List, Optional, Tuple
+from pydantic import BaseModel, Field, field_validator
+
+import clock
+
+# Compiled once at import (validate_email/validate_phone run on every schedule request)
+# Same rule as the front-end (script.js): no whitespace, one @, a dot in the domain
+_EMAIL_RE = re.compile(r'[^\s@]+@[^\s@]+\.[^\s@]+')
+_PHONE_STRIP_RE = re.compile(r'[\s\-()]')
+# Characters stripped by sanitize_user_input, removed in a single translate pass
+_SANITIZE_TABLE = str.maketrans('', '', '<>')
+
+
+def parse_date(date_str: str) -> date:
+    """
+    Parse a YYYY-MM-DD date string
+    
+    Args:
+        date_str: Date in YYYY-MM-DD format
+        
+    Returns:
+        date object (raises ValueError if invalid)
+    """
+    # Zero-padded ISO dates go through the C fromisoformat fast path;
+    # anything else keeps strptime's behaviour (e.g. "2025-1-5")
+    if len(date_str) == 10 and date_str[4] == '-' and date_str[7] == '-':
+        return date.fromisoformat(date_str)
+    return datetime.strptime(date_str, '%Y-%m-%d').date()
+
+
+def parse_time(time_str: str) -> time:
+    """
+    Parse an HH:MM (24-hour) time string
+    
+    Args:
+        time_str: Time in HH:MM format
+        
+    Returns:
+        time object (raises ValueError if invalid)
+    """
+    if len(time_str) == 5 and time_str[2] == ':':
+        return time.fromisoformat(time_str)
+    return datetime.strptime(time_str, '%H:%M').time()
 
 
 def validate_datetime(date_str: str, time_str: str) -> Tuple[bool, str]:
@@ -20,10 +62,10 @@ def validate_datetime(date_str: str, time_str: str) -> Tuple[bool, str]:
     """
     try:
         # Parse date
-        date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
+        date_obj = parse_date(date_str)
         
         # Parse time
-        time_obj = datetime.strptime(time_str, '%H:%M').time()
+        time_obj = parse_time(time_str)
         
         # Just validate the format — any date/time is allowed
         datetime.combine(date_obj, time_obj)  # will raise ValueError if invalid
@@ -45,8 +87,8 @@ def is_future_datetime(datetime_str: str) -> bool:
         True if future, False otherwise
     """
     try:
-        dt = datetime.fromisoformat(datetime_str.replace('Z', '+00:00'))
-        return dt > datetime.now()
+        dt = datetime.fromisoformat(datetime_str)
+        return dt > clock.now().now
     except Exception:
         return False
 
@@ -73,7 +115,7 @@ def sanitize_user_input(text: str, max_length: int = 500) -> str:
         text = text[:max_length]
     
     # Remove potentially dangerous characters (basic XSS prevention)
-    text = text.replace('<', '').replace('>', '')
+    text = text.translate(_SANITIZE_TABLE)
     
     return text
 
@@ -87,13 +129,17 @@ def validate_email(email: str) -> bool:
         
     Returns:
         True if valid format, False otherwise
+    
+    >>> validate_email("o'brien@example.com"), validate_email("first&last@example.com")
+    (True, True)
+    >>> validate_email("a b@example.com"), validate_email("a@example.com\\nBcc: x@y.z")
+    (False, False)
     """
     if not email:
         return False
     
-    # Basic email regex pattern
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return bool(re.match(pattern, email))
+    # Basic email regex pattern (fullmatch instead of ^...$ anchors)
+    return _EMAIL_RE.fullmatch(email) is not None
 
 
 def validate_phone(phone: str) -> bool:
@@ -110,7 +156,11 @@ def validate_phone(phone: str) -> bool:
         return False
     
     # Remove common separators
-    clean_phone = re.sub(r'[\s\-\(\)]', '', phone)
+    clean_phone = _PHONE_STRIP_RE.sub('', phone)
+    
+    # Allow E.164 "+<country code>" prefix (what the front-end sends)
+    if clean_phone.startswith('+'):
+        clean_phone = clean_phone[1:]
     
     # Check if it's all digits and reasonable length
     return clean_phone.isdigit() and 10 <= len(clean_phone) <= 15
@@ -150,3 +200,53 @@ def validate_appointment_data(data: dict) -> Tuple[bool, str]:
         return False, "Invalid phone number format"
     
     return True, ""
+
+
+def validate_appointment_data_batch(records: List[dict]) -> List[Tuple[bool, str]]:
+    """
+    Validate many appointment records
+    
+    Args:
+        records: List of dictionaries with appointment fields
+        
+    Returns:
+        List of (is_valid, error_message), in input order
+    """
+    return [validate_appointment_data(record) for record in records]
+
+
+class ScheduleRequest(BaseModel):
+    """Request body for POST /api/appointments/schedule"""
+    dateTime: datetime = Field(..., description="Appointment time (ISO 8601, UTC)")
+    subject: str = Field(..., min_length=1, max_length=500, description="Appointment subject/title")
+    email: Optional[str] = Field(None, description="Email address for notifications")
+    phone: Optional[str] = Field(None, description="Phone number for SMS notifications")
+
+    @field_validator('dateTime')
+    @classmethod
+    def _to_utc(cls, value: datetime) -> datetime:
+        """Normalize to a stdlib UTC datetime (naive = UTC, like the scheduler).
+        pydantic's own TzInfo must not end up pickled in the job store."""
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+
+    @field_validator('email', 'phone', mode='before')
+    @classmethod
+    def _empty_to_none(cls, value):
+        """The front-end may send "" for a skipped contact field"""
+        return value or None
+
+    @field_validator('email')
+    @classmethod
+    def _check_email(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None and not validate_email(value):
+            raise ValueError("Invalid email format")
+        return value
+
+    @field_validator('phone')
+    @classmethod
+    def _check_phone(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None and not validate_phone(value):
+            raise ValueError("Invalid phone number format")
+        return value